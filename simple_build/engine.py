@@ -44,11 +44,20 @@ class Engine:
         # List of buildfiles that we're currently visiting - these are relative to the root directory
         self._active_buildfile_visits = []
 
-        # Map of all targets declared at a global scope in a buildfile
-        # Maps (buildfile_directory, target_name) -> (Target)
+        # Map of all targets and target factories declared at a global scope in a buildfile
+        # Maps (buildfile_directory, target_name) -> (Target or TargetFactory)
         # (buildfile_directory, None) is the default target
         self._targets = {}
 
+        # Maps (TargetFactory) -> (buildfile_directory) for each target factory declared
+        self._target_factory_buildfile_directories = {}
+
+        # Maps (TargetFactory) -> (Target) for each target factory which has been materialized
+        self._materialized_targets = {}
+
+        # Target factories which are currently being materialized - used to detect cycles
+        self._active_target_factories = []
+
         # Maps (operation_type) -> OperationSettings
         self._operation_default_settings = {}
 
@@ -115,14 +124,52 @@ class Engine:
         self._buildfile_operation_default_settings[key] = copy.deepcopy(operation_settings)
 
     # Sets the default target to be built if no target is explicitly specified
+    # A TargetFactory may be provided, in which case the target is only created if the default target is built
     def set_buildfile_default_target(self, default_target):
-        if not issubclass(default_target, graph_objects.Target):
+        if not isinstance(default_target, (graph_objects.Target, graph_objects.TargetFactory)):
             raise SimpleBuildError("'{}' is not a Target".format(str(default_target)))
 
         buildfile_directory = self._get_current_buildfile_directory()
 
         self._targets[(buildfile_directory, None)] = default_target
 
+    # Associates a newly constructed target factory with the current buildfile
+    def register_target_factory(self, target_factory):
+        self._target_factory_buildfile_directories[target_factory] = self._get_current_buildfile_directory()
+
+    # Returns the target created by the target factory, calling it in the context of its buildfile if it hasn't been called yet
+    def materialize_target_factory(self, target_factory):
+        target = self._materialized_targets.get(target_factory, None)
+        if target is not None:
+            return target
+
+        if target_factory in self._active_target_factories:
+            raise SimpleBuildError(
+                "Recursive target factories detected: {}".format(
+                    " -> ".join(x.function.__name__ for x in self._active_target_factories + [target_factory])))
+
+        buildfile_directory = self._target_factory_buildfile_directories[target_factory]
+
+        cwd = os.getcwd()
+        try:
+            self._active_target_factories.append(target_factory)
+            self._active_buildfile_visits.append(buildfile_directory)
+            os.chdir(self._root_directory / buildfile_directory)
+            target = target_factory.function()
+        finally:
+            os.chdir(cwd)
+            self._active_buildfile_visits.pop()
+            self._active_target_factories.pop()
+
+        if not isinstance(target, graph_objects.Target):
+            raise SimpleBuildError(
+                "Target factory '{}' returned '{}', which is not a Target".format(
+                    target_factory.function.__name__,
+                    str(target)))
+
+        self._materialized_targets[target_factory] = target
+        return target
+
     # Visit the buildfile in the given path, which should be specified as an absolute path
     def visit_buildfile(self, path):
         try:
@@ -133,16 +180,17 @@ class Engine:
         if not (path / _BUILDFILE_NAME).exists():
             raise SimpleBuildError("'{}' not found in directory '{}'".format(_BUILDFILE_NAME, str(relative_path)))
 
-        if relative_path in self._active_buildfile_visits:
-            raise SimpleBuildError(
-                "Recursive dependencies detected: {}".format(
-                    " -> ".join(str(x) for x in self._active_buildfile_visits + [relative_path])))
-
         # Check if we've already visited this module
+        # Do this before checking for cycles because a target factory may visit buildfiles that depend on its own buildfile
         module = self._buildfile_modules.get(relative_path, None)
         if module is not None:
             return module
 
+        if relative_path in self._active_buildfile_visits:
+            raise SimpleBuildError(
+                "Recursive dependencies detected: {}".format(
+                    " -> ".join(str(x) for x in self._active_buildfile_visits + [relative_path])))
+
         try:
             self._active_buildfile_visits.append(relative_path)
 
@@ -176,9 +224,9 @@ class Engine:
         finally:
             self._active_buildfile_visits.pop()
 
-        # Find all targets declared at a global scope in this module
+        # Find all targets and target factories declared at a global scope in this module
         for name, value in module.__dict__.items():
-            if isinstance(value, graph_objects.Target):
+            if isinstance(value, (graph_objects.Target, graph_objects.TargetFactory)):
                 key = (relative_path, name)
                 assert key not in self._targets
                 self._targets[key] = value
@@ -205,6 +253,10 @@ class Engine:
         except ValueError:
             raise SimpleBuildError("The target '{}' was not found".format(target_string))
 
+        # Buildfiles other than the one in the current directory are only visited once one of their targets is requested
+        if buildfile_directory not in self._buildfile_modules and (target_path / _BUILDFILE_NAME).exists():
+            self.visit_buildfile(target_path)
+
         target_key = (buildfile_directory, target_name)
         target = self._targets.get(target_key, None)
         if target is None:
@@ -213,6 +265,10 @@ class Engine:
             else:
                 raise SimpleBuildError("The target '{}' was not found".format(target_string))
 
+        # Only the target factories reachable from the requested target are materialized
+        if isinstance(target, graph_objects.TargetFactory):
+            target = target()
+
         if target.operation is None:
             raise SimpleBuildError("The target '{}' is not the output of any operation".format(target_string))
 
@@ -226,10 +282,6 @@ class Engine:
         all_targets_operations = set()
         while len(operations_stack) > 0:
             operation = operations_stack.pop()
-            for target in operation.inputs:
-                all_targets_operations.add((target, operation))
-            for target in operation.outputs:
-                all_targets_operations.add((target, operation))
 
             # We push None onto the stack to indicate this operation has been fully visited
             if operation is None:
@@ -239,8 +291,12 @@ class Engine:
                 operations_path.append(operation)
                 operations_stack.append(None)
 
+            for target in operation.inputs:
+                all_targets_operations.add((target, operation))
+            for target in operation.outputs:
+                all_targets_operations.add((target, operation))
+
             node = nodes_for_operations[operation]
-            root_nodes.add(node)
 
             for input_target in operation.inputs:
                 if input_target.operation is not None:
@@ -260,8 +316,13 @@ class Engine:
                     input_node.output_nodes.add(node)
                     operations_stack.append(input_target.operation)
 
-        # Calculate modification timestamps all at once
-        target_modification_timestamps = dict(((t, o), t.get_modification_timestamp(o)) for t, o in all_targets_operations)
+            if node.unresolved_input_count == 0:
+                root_nodes.add(node)
+
+        # Calculate modification timestamps all at once - these aren't needed when cleaning
+        target_modification_timestamps = {}
+        if not clean:
+            target_modification_timestamps = dict(((t, o), t.get_modification_timestamp(o)) for t, o in all_targets_operations)
 
         # Now run the graph
         # $TODO multithread this
@@ -273,10 +334,10 @@ class Engine:
             node.operation.activate()
 
             if clean:
-                node.active_implementation.clean()
+                node.operation.active_implementation.clean()
             else:
                 input_modification_timestamp = float("-inf")
-                for input_target in operation.inputs:
+                for input_target in node.operation.inputs:
                     modification_timestamp = target_modification_timestamps[(input_target, node.operation)]
                     if modification_timestamp is None:
                         # If any input target can't provide a modification timestamp, we always run the operation
@@ -286,7 +347,7 @@ class Engine:
 
                 stale = input_modification_timestamp is None
                 if not stale:
-                    for output_target in operation.outputs:
+                    for output_target in node.operation.outputs:
                         # Check to see if the inputs were last modified after any output was last built
                         modification_timestamp = target_modification_timestamps[(output_target, node.operation)]
                         if modification_timestamp is None or input_modification_timestamp > modification_timestamp:
@@ -295,7 +356,7 @@ class Engine:
                             break
 
                 if stale:
-                    node.active_implementation.run()
+                    node.operation.active_implementation.build()
 
             for output_node in node.output_nodes:
                 output_node.unresolved_input_count -= 1
@@ -330,7 +391,7 @@ class Engine:
             default_settings = operation_type.get_default_settings()
             if not isinstance(default_settings, graph_objects.OperationSettings):
                 raise SimpleBuildError("'{}' is not an OperationSettings".format(str(default_settings)))
-            self._operation_default_settings[operation_type] = operation_type
+            self._operation_default_settings[operation_type] = default_settings
 
         return default_settings
 
@@ -21,6 +21,21 @@ class Target:
     def validate(self):
         raise NotImplementedError()
 
+# Wraps a function which creates and returns a Target, deferring creation until the Target is first needed
+# When declared at a global scope in a buildfile (typically as a decorator), the Target is registered under the function's name
+# Calling the factory returns the Target, creating it and its operations on the first call
+class TargetFactory:
+    def __init__(self, function):
+        self._function = function
+        engine_accessor.get().register_target_factory(self)
+
+    @property
+    def function(self):
+        return self._function
+
+    def __call__(self):
+        return engine_accessor.get().materialize_target_factory(self)
+
 # Settings associated with an Operation
 # Each Operation type provides a static method which returns default settings
 # The root-level buildfile gets its default settings from this method
@@ -30,7 +45,7 @@ class OperationSettings:
 
 class Operation:
     def __init__(self):
-        self._settings = copy.deepcopy(engine_accessor.get().get_current_buildfile_operation_settings(type(self)))
+        self._settings = copy.deepcopy(engine_accessor.get().get_buildfile_operation_settings(type(self)))
         self._settings_type = type(self._settings)
         self._inputs = []
         self._outputs = []
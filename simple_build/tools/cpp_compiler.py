@@ -1,10 +1,46 @@
+import hashlib
+import os
+import pathlib
+
+from simple_build import engine_accessor
 from simple_build import graph_objects
 from simple_build.simple_build_error import SimpleBuildError
+from simple_build.tools import cpp_file_target
 
 class CppCompilerSettings(graph_objects.OperationSettings):
     def __init__(self):
         super().__init__()
 
+        # When enabled, translation units passed to create_compiler_operations() are grouped into unity batches
+        self.unity_build = False
+
+        # Average number of files per unity batch before the limits below are applied
+        self.unity_batch_target_files = 8
+
+        # Batches exceeding either limit are split - None means no limit
+        # Sources which don't exist yet (e.g. generated sources) are treated as empty when applying the byte limit
+        self.unity_batch_max_bytes = 256 * 1024
+        self.unity_batch_max_files = None
+
+        # Directory in which generated unity files are placed, relative to the buildfile directory
+        self.unity_directory = "unity"
+
+        # Absolute paths of files which break unity builds - these are always compiled on their own
+        self.unity_excluded_files = set()
+
+        # Absolute paths of files split out of their unity batch, e.g. because they are being edited often
+        # Unlike excluded files, isolated files still take up their slot when batches are formed, so isolating a file
+        # only changes the batch it was in
+        self.unity_isolated_files = set()
+
+    # Path is relative to the current directory
+    def exclude_from_unity_build(self, path):
+        self.unity_excluded_files.add(pathlib.Path(path).resolve())
+
+    # Path is relative to the current directory
+    def isolate_from_unity_build(self, path):
+        self.unity_isolated_files.add(pathlib.Path(path).resolve())
+
 class CppCompilerOperation(graph_objects.Operation):
     @staticmethod
     def get_default_settings():
@@ -25,3 +61,150 @@ class CppCompilerOperation(graph_objects.Operation):
         if self.active_implementation is None:
             raise SimpleBuildError("An implementation for '{}' has not yet been assigned".format(type(self)))
         return self.active_implementation.get_include_directories()
+
+# Generates a unity file which #includes each translation unit in a unity batch
+# The output must be a UnityCppFileTarget, which reports itself as out of date whenever its contents on disk don't match
+# source_paths holds every source passed to the create_compiler_operations() call which produced this batch - unity files
+# in the same directory which #include any of these sources were produced by an earlier batching of the same call and are
+# removed when this operation runs
+class UnityFileOperation(graph_objects.Operation):
+    def __init__(self, unity_target, source_paths):
+        super().__init__()
+        self.add_output(unity_target)
+        self._source_paths = frozenset(pathlib.Path(x).resolve() for x in source_paths)
+
+    @property
+    def source_paths(self):
+        return (x for x in self._source_paths)
+
+    @staticmethod
+    def get_default_settings():
+        return graph_objects.OperationSettings()
+
+    def get_operation_implementation(self):
+        return _UnityFileOperationImplementation(self)
+
+class _UnityFileOperationImplementation(graph_objects.OperationImplementation):
+    def build(self):
+        source_paths = set(self.operation.source_paths)
+        for unity_target in self.operation.outputs:
+            unity_target.write()
+
+            # Remove unity files left behind by batches of the same sources which no longer exist
+            for path in unity_target.path.parent.glob("unity_*.cpp"):
+                if path == unity_target.path:
+                    continue
+                previous_source_paths = cpp_file_target.UnityCppFileTarget.read_source_paths(path)
+                if previous_source_paths is not None and not source_paths.isdisjoint(previous_source_paths):
+                    _remove_file(path)
+
+    def clean(self):
+        for unity_target in self.operation.outputs:
+            _remove_file(unity_target.path)
+
+# Groups the source paths provided into unity batches according to the settings provided
+# Returns a list of (unity_name, source_paths) tuples - unity_name is None for files which are compiled on their own
+# Files are first split into chunks in sorted path order, with a chunk ending after each file whose path hash is divisible
+# by unity_batch_target_files. Chunk boundaries therefore only depend on paths, so adding, removing, or editing a file
+# only affects the chunk containing it. Chunks exceeding unity_batch_max_files or unity_batch_max_bytes are then split
+# greedily, which can only move boundaries within that chunk.
+def get_unity_batches(source_paths, settings):
+    source_paths = sorted(set(pathlib.Path(x).resolve() for x in source_paths))
+    if not settings.unity_build:
+        return [(None, [x]) for x in source_paths]
+
+    if settings.unity_batch_target_files is None or settings.unity_batch_target_files < 1:
+        raise SimpleBuildError("unity_batch_target_files must be at least 1")
+
+    # Excluded files still take part in choosing chunk boundaries so that excluding a file only affects its own chunk
+    chunks = []
+    chunk = []
+    for path in source_paths:
+        chunk.append(path)
+        if _get_path_hash(path) % settings.unity_batch_target_files == 0:
+            chunks.append(chunk)
+            chunk = []
+    if len(chunk) > 0:
+        chunks.append(chunk)
+
+    batches = []
+    for chunk in chunks:
+        batch = []
+        batch_bytes = 0
+        for path in chunk:
+            if path in settings.unity_excluded_files:
+                continue
+
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                # The file may be generated during the build
+                size = 0
+
+            if len(batch) > 0:
+                files_exceeded = settings.unity_batch_max_files is not None and len(batch) >= settings.unity_batch_max_files
+                bytes_exceeded = settings.unity_batch_max_bytes is not None and batch_bytes + size > settings.unity_batch_max_bytes
+                if files_exceeded or bytes_exceeded:
+                    batches.append(batch)
+                    batch = []
+                    batch_bytes = 0
+
+            batch.append(path)
+            batch_bytes += size
+
+        if len(batch) > 0:
+            batches.append(batch)
+
+    # Split isolated files out only after batch boundaries have been determined
+    result = []
+    for batch in batches:
+        batched_paths = [x for x in batch if x not in settings.unity_isolated_files]
+        if len(batched_paths) > 1:
+            unity_name = "unity_{}_{:08x}".format(batch[0].stem, _get_path_hash(batch[0]) % (1 << 32))
+            result.append((unity_name, batched_paths))
+        elif len(batched_paths) == 1:
+            result.append((None, batched_paths))
+        result.extend((None, [x]) for x in batch if x in settings.unity_isolated_files)
+    result.extend((None, [x]) for x in source_paths if x in settings.unity_excluded_files)
+
+    return result
+
+# Creates a CppCompilerOperation for each translation unit in source_paths, or for each unity batch if unity builds are
+# enabled in the current buildfile's settings
+# Each returned operation has a single input target - output targets should be added by the caller
+# For unity batches, the input target is the output of a UnityFileOperation which generates the unity file
+# Paths are relative to the current directory
+def create_compiler_operations(source_paths):
+    source_paths = list(source_paths)
+    settings = CppCompilerOperation.get_buildfile_settings()
+    unity_directory = pathlib.Path(settings.unity_directory).resolve()
+
+    operations = []
+    for unity_name, batch_source_paths in get_unity_batches(source_paths, settings):
+        if unity_name is None:
+            assert len(batch_source_paths) == 1
+            input_target = cpp_file_target.CppFileTarget(batch_source_paths[0])
+        else:
+            input_target = cpp_file_target.UnityCppFileTarget(unity_directory / (unity_name + ".cpp"), batch_source_paths)
+            UnityFileOperation(input_target, source_paths)
+
+        operation = CppCompilerOperation()
+        operation.add_input(input_target)
+        operations.append(operation)
+
+    return operations
+
+# Hashes paths relative to the project root so that batches don't depend on where the project is located
+def _get_path_hash(path):
+    try:
+        path = path.relative_to(engine_accessor.get().root_directory)
+    except ValueError:
+        pass
+    return int(hashlib.sha1(path.as_posix().encode()).hexdigest(), 16)
+
+def _remove_file(path):
+    try:
+        if path.exists():
+            os.remove(path)
+    except OSError as e:
+        raise SimpleBuildError("Failed to remove unity file '{}': {}".format(str(path), str(e)))
@@ -2,6 +2,7 @@ import os
 import pathlib
 import re
 
+from simple_build.simple_build_error import SimpleBuildError
 from simple_build.tools import file_target
 
 class CppFileTarget(file_target.FileTarget):
@@ -48,6 +49,60 @@ class CppFileTarget(file_target.FileTarget):
 
         return most_recent_modification_timestamp
 
+# A source file generated by a UnityFileOperation which #includes each translation unit in a unity batch
+# The file is only rewritten when its contents change, so its modification timestamp only advances when the batch's
+# membership changes - edits to the batched translation units are picked up by crawling the #include statements
+class UnityCppFileTarget(CppFileTarget):
+    def __init__(self, path, source_paths):
+        super().__init__(path)
+        self._source_paths = [pathlib.Path(x).absolute() for x in source_paths]
+
+    @property
+    def source_paths(self):
+        return (x for x in self._source_paths)
+
+    def get_contents(self):
+        return "".join("#include \"{}\"\n".format(x.as_posix()) for x in self._source_paths)
+
+    # Returns the source paths #included by an existing unity file, or None if it can't be read
+    @staticmethod
+    def read_source_paths(path):
+        try:
+            with open(path) as file:
+                return [pathlib.Path(x) for x in re.findall(r'^#include "([^"]*)"$', file.read(), re.MULTILINE)]
+        except OSError:
+            return None
+
+    def is_up_to_date(self):
+        try:
+            with open(self._path) as file:
+                return file.read() == self.get_contents()
+        except OSError:
+            return False
+
+    def get_modification_timestamp(self, operation):
+        if not self.is_up_to_date():
+            # The file is missing or its batch membership has changed, so it will be (re)generated
+            return None
+
+        if operation is self.operation:
+            # The generating operation only cares about the file itself, not the files it #includes
+            return file_target.FileTarget.get_modification_timestamp(self, operation)
+
+        return super().get_modification_timestamp(operation)
+
+    # Writes the unity file, leaving it untouched if its contents are already correct
+    def write(self):
+        if self.is_up_to_date():
+            return
+
+        try:
+            os.makedirs(self._path.parent, exist_ok=True)
+            with open(self._path, "w") as file:
+                file.write(self.get_contents())
+        except OSError as e:
+            raise SimpleBuildError("Failed to write unity file '{}': {}".format(str(self._path), str(e)))
+
 class _IncludeCache:
     def __init__(self):
         # Maps (file_path) -> (list_of_include_strings, is_quoted)
@@ -9,6 +9,10 @@ class FileTarget(graph_objects.Target):
         super().__init__()
         self._path = pathlib.Path(path).absolute()
 
+    @property
+    def path(self):
+        return self._path
+
     def get_modification_timestamp(self, operation):
         try:
             return os.path.getmtime(self._path)
@@ -7,8 +7,12 @@ def get_root_directory():
     return engine_accessor.get().root_directory
 
 # Path is relative to the current directory
-def depends(path):
+# If lazy is True, the buildfile is not visited until an attribute of the returned object is first accessed - this is
+# useful when the dependency is only used from within target factories
+def depends(path, lazy=False):
     absolute_path = pathlib.Path(path).resolve()
+    if lazy:
+        return _LazyBuildfile(absolute_path)
     return engine_accessor.get().visit_buildfile(absolute_path)
 
 # Returns a dict of the command-line NAME=VALUE config settings provided
@@ -17,3 +21,16 @@ def get_config_settings():
 
 def set_default_target(target):
     engine_accessor.get().set_buildfile_default_target(target)
+
+class _LazyBuildfile:
+    def __init__(self, path):
+        self._path = path
+        self._module = None
+
+    def __getattr__(self, name):
+        # Access through __dict__ so that we don't recurse if this object is only partially constructed
+        if self.__dict__.get("_module", None) is None:
+            if "_path" not in self.__dict__:
+                raise AttributeError(name)
+            self._module = engine_accessor.get().visit_buildfile(self._path)
+        return getattr(self._module, name)
@@ -0,0 +1,64 @@
+from simple_build import simple_build as sb
+
+# Records buildfile visits, target factory calls, and operation runs so that laziness can be checked
+events = ["visit root"]
+
+library = sb.depends("library", lazy=True)
+unused = sb.depends("unused", lazy=True)
+
+class MyTarget(sb.Target):
+	def get_modification_timestamp(self, operation):
+		# Always out of date so that every operation reached runs
+		return None
+
+class PrintSettings(sb.OperationSettings):
+	pass
+
+class PrintOperation(sb.Operation):
+	# check is called with the events recorded so far when the operation runs
+	def __init__(self, name, inputs, check=None):
+		super().__init__()
+		self.name = name
+		self.check = check
+		for input in inputs:
+			self.add_input(input)
+		self.add_output(MyTarget())
+
+	@staticmethod
+	def get_default_settings():
+		return PrintSettings()
+
+	def get_operation_implementation(self):
+		return PrintOperationImplementation(self)
+
+	@property
+	def output(self):
+		return next(self.outputs)
+
+class PrintOperationImplementation(sb.OperationImplementation):
+	def build(self):
+		print("Running '{}'".format(self.operation.name))
+		events.append("run " + self.operation.name)
+		if self.operation.check is not None:
+			self.operation.check(events)
+			print("Checks passed")
+
+def check_tool(events):
+	assert events == ["visit root", "create tool", "visit library", "create lib", "run lib", "run tool"], events
+
+@sb.TargetFactory
+def tool():
+	print("Creating tool")
+	events.append("create tool")
+	# A factory requested more than once returns the same target
+	assert library.lib() is library.lib()
+	return PrintOperation("tool", [library.lib()], check_tool).output
+
+def check_other_tool(events):
+	assert events == ["visit root", "create other_tool", "visit unused", "create unused_lib", "run unused_lib", "run other_tool"], events
+
+@sb.TargetFactory
+def other_tool():
+	print("Creating other_tool")
+	events.append("create other_tool")
+	return PrintOperation("other_tool", [unused.unused_lib()], check_other_tool).output
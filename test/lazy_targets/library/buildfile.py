@@ -0,0 +1,16 @@
+from simple_build import simple_build as sb
+
+parent = sb.depends("..")
+
+print("Visiting library")
+parent.events.append("visit library")
+
+def check_lib(events):
+	assert events[-3:] == ["visit library", "create lib", "run lib"], events
+	assert "visit unused" not in events, events
+
+@sb.TargetFactory
+def lib():
+	print("Creating lib")
+	parent.events.append("create lib")
+	return parent.PrintOperation("lib", [], check_lib).output
@@ -0,0 +1,12 @@
+from simple_build import simple_build as sb
+
+parent = sb.depends("..")
+
+print("Visiting unused")
+parent.events.append("visit unused")
+
+@sb.TargetFactory
+def unused_lib():
+	print("Creating unused_lib")
+	parent.events.append("create unused_lib")
+	return parent.PrintOperation("unused_lib", []).output
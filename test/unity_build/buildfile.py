@@ -0,0 +1,132 @@
+import os
+import pathlib
+import shutil
+
+from simple_build import simple_build as sb
+from simple_build.tools import cpp_compiler
+from simple_build.tools import cpp_file_target
+
+def write_sources(directory, sizes):
+	paths = []
+	for name, size in sizes.items():
+		path = pathlib.Path(directory).resolve() / (name + ".cpp")
+		with open(path, "w") as file:
+			file.write("/" * size)
+		paths.append(path)
+	return paths
+
+def get_batch_keys(batches):
+	return set(tuple(x.name for x in paths) for _, paths in batches)
+
+def make_settings():
+	settings = cpp_compiler.CppCompilerSettings()
+	settings.unity_build = True
+	settings.unity_batch_max_bytes = None
+	return settings
+
+# A fixed directory is used so that batches, which depend on path hashes, are the same on every run
+temp_directory = pathlib.Path("batching_sources").resolve()
+shutil.rmtree(temp_directory, ignore_errors=True)
+os.makedirs(temp_directory)
+try:
+	names = ["file_{:02}".format(i) for i in range(40)]
+
+	# Batching by count
+	settings = make_settings()
+	settings.unity_batch_max_files = 3
+	paths = write_sources(temp_directory, dict((x, 100) for x in names))
+	batches = cpp_compiler.get_unity_batches(paths, settings)
+	assert all(len(paths) <= 3 for _, paths in batches)
+	assert sorted(x.name for _, paths in batches for x in paths) == sorted(x.name for x in paths)
+
+	# Adding a file only changes the batch it lands in
+	settings = make_settings()
+	before = get_batch_keys(cpp_compiler.get_unity_batches(paths, settings))
+	new_paths = paths + write_sources(temp_directory, { "file_new": 100 })
+	after = get_batch_keys(cpp_compiler.get_unity_batches(new_paths, settings))
+	assert len(before - after) <= 1
+	os.remove(new_paths[-1])
+
+	# Batching by bytes - growing a file only changes the batches in its chunk, not every batch after it
+	settings = make_settings()
+	settings.unity_batch_max_bytes = 250
+	before = cpp_compiler.get_unity_batches(paths, settings)
+	assert all(len(x) == 1 or sum(os.path.getsize(p) for p in x) <= 250 for _, x in before)
+	write_sources(temp_directory, { names[20]: 200 })
+	after = cpp_compiler.get_unity_batches(paths, settings)
+	changed = [x for x in before if x not in after]
+	assert len(changed) > 0
+	assert len(changed) < len(before) // 2
+	assert all(paths[0] not in x and paths[-1] not in x for _, x in changed)
+	write_sources(temp_directory, { names[20]: 100 })
+
+	# Sources which don't exist yet are batched rather than failing
+	settings = make_settings()
+	settings.unity_batch_target_files = 1000
+	missing_path = temp_directory / "generated.cpp"
+	batches = cpp_compiler.get_unity_batches(paths[:2] + [missing_path], settings)
+	assert len(batches) == 1 and missing_path in batches[0][1]
+
+	# Excluded and isolated files are compiled on their own
+	settings = make_settings()
+	settings.unity_batch_target_files = 1000
+	settings.unity_excluded_files.add(paths[1])
+	settings.unity_isolated_files.add(paths[2])
+	batches = cpp_compiler.get_unity_batches(paths, settings)
+	assert (None, [paths[1]]) in batches
+	assert (None, [paths[2]]) in batches
+	assert all(paths[1] not in x[1] and paths[2] not in x[1] for x in batches if x[0] is not None)
+
+	# Isolating a file doesn't rename any other batch
+	settings = make_settings()
+	settings.unity_batch_max_files = 4
+	before = cpp_compiler.get_unity_batches(paths, settings)
+	settings.unity_isolated_files.add(paths[5])
+	after = cpp_compiler.get_unity_batches(paths, settings)
+	assert set(x[0] for x in before if x[0] is not None) >= set(x[0] for x in after if x[0] is not None)
+
+	# Unity files are only rewritten when their contents change
+	unity_path = pathlib.Path(temp_directory) / "unity" / "unity_test.cpp"
+	unity_target = cpp_file_target.UnityCppFileTarget(unity_path, paths[:2])
+	assert unity_target.get_modification_timestamp(None) is None
+	assert not unity_path.exists()
+	unity_target.write()
+	modification_timestamp = os.stat(unity_path).st_mtime_ns
+	cpp_file_target.UnityCppFileTarget(unity_path, paths[:2]).write()
+	assert os.stat(unity_path).st_mtime_ns == modification_timestamp
+	unity_target = cpp_file_target.UnityCppFileTarget(unity_path, paths[:3])
+	assert not unity_target.is_up_to_date()
+	unity_target.write()
+	assert unity_target.is_up_to_date()
+	with open(unity_path) as file:
+		assert file.read().count("#include") == 3
+
+	# Cleaning a unity file only removes that file, and building one only removes stale unity files for the same sources
+	def build_unity_file(name, batch_source_paths, source_paths):
+		unity_target = cpp_file_target.UnityCppFileTarget(temp_directory / "unity" / name, batch_source_paths)
+		operation = cpp_compiler.UnityFileOperation(unity_target, source_paths)
+		operation.activate()
+		operation.active_implementation.build()
+		return operation
+	a_operation = build_unity_file("unity_a.cpp", paths[0:2], paths[0:2])
+	c_operation = build_unity_file("unity_c.cpp", paths[2:4], paths[2:4])
+	a_operation.active_implementation.clean()
+	assert not (temp_directory / "unity" / "unity_a.cpp").exists()
+	assert (temp_directory / "unity" / "unity_c.cpp").exists()
+	build_unity_file("unity_a.cpp", paths[0:2], paths[0:2])
+	build_unity_file("unity_b.cpp", paths[1:2], paths[0:2])
+	assert not (temp_directory / "unity" / "unity_a.cpp").exists()
+	assert (temp_directory / "unity" / "unity_b.cpp").exists()
+	assert (temp_directory / "unity" / "unity_c.cpp").exists()
+finally:
+	shutil.rmtree(temp_directory)
+
+# Run "main.py unity_file" to generate the unity file and "main.py --clean unity_file" to remove it
+cpp_compiler.CppCompilerOperation.get_buildfile_settings().unity_build = True
+cpp_compiler.CppCompilerOperation.get_buildfile_settings().unity_batch_target_files = 1000
+compiler_operations = cpp_compiler.create_compiler_operations(["src/a.cpp", "src/b.cpp", "src/c.cpp"])
+assert len(compiler_operations) == 1
+unity_file = next(compiler_operations[0].inputs)
+assert isinstance(unity_file, cpp_file_target.UnityCppFileTarget)
+
+print("Unity build checks passed")
@@ -0,0 +1 @@
+int c() { return 0; }